@@ -9,7 +9,6 @@ import logging
 # pydub is optional; not all environments have it installed or have ffmpeg on PATH
 try:
     from pydub import AudioSegment
-    from pydub.generators import Sine, WhiteNoise
     PYDUB_AVAILABLE = True
 except Exception:
     PYDUB_AVAILABLE = False
@@ -20,8 +19,27 @@ import time
 import tempfile
 import re
 import json
+import queue
+import threading
+import contextlib
+import concurrent.futures
 import random
 import math
+import wave
+
+# Broadened token specs to handle Java, C#, Go, Python, JS common keywords and patterns.
+# The combined lexer is compiled once at import instead of on every tokenize_code call.
+_TOKEN_SPECS = [
+    ('builtin', r"\b(len|print|println|printf|append|push|pop|map|filter|reduce|range|make|fmt\.Println|fmt\.Printf|console\.log|System\.out\.println|toString|parseInt|parseFloat|JSON\.stringify)\b"),
+    ('keyword', r"\b(function|const|let|var|return|if|else|for|while|switch|case|break|continue|try|catch|finally|throw|await|async|import|from|class|new|this|super|extends|implements|interface|package|public|private|protected|static|final|void|int|long|short|byte|char|boolean|true|false|null)\b"),
+    ('string', r'(".*?"|\'.*?\')'),
+    ('number', r'\b(\d+(?:\.\d+)?)\b'),
+    ('comment', r'(//.*|/\*[\s\S]*?\*/|#.*)'),
+    ('operator', r'([+\-*/%=<>!&|:^~]+)'),
+    ('function', r'(\b\w+)(?=\()'),
+    ('bracket', r'([(){}\[\];,])')
+]
+_TOKEN_RE = re.compile('|'.join(f"(?P<{name}>{pattern})" for name, pattern in _TOKEN_SPECS))
 
 class CodeExecutor:
     @staticmethod
@@ -191,6 +209,16 @@ class ShortsVideoGenerator:
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.audio_dir, exist_ok=True)
 
+        # Per-font character width tables used for fast text measurement (see _char_widths)
+        self._char_width_tables = {}
+        # Cell width per font when every printable ASCII character has the same advance (monospace)
+        self._cell_widths = {}
+        # Rasterized glyph masks keyed by font and character (see _glyph)
+        self._glyph_cache = {}
+
+        # Tuning knobs read from the environment once instead of inside the render/mix loops
+        self._load_cfg()
+
         # Try loading keyboard samples from audio/keys
         self.key_samples = []
         
@@ -202,12 +230,73 @@ class ShortsVideoGenerator:
             logging.info("ffmpeg not found in PATH. Audio features will be disabled.")
 
         self.audio_enabled = PYDUB_AVAILABLE and self.ffmpeg_available
+        # Sample rate used by the NumPy sound synthesis helpers (see _synth_segment)
+        self.synth_rate = 44100
+        # Background pads: a few variants, each synthesized once and reused (see create_background_music)
+        self.pad_variants = 6
+        self._pad_cache = {}
+        # Synthesized click/enter sounds are built once and reused by every video;
+        # clicks are made a bit softer or louder with KEY_CLICK_GAIN_DB so background music sits under them
+        self._click_sound = self.create_mechanical_click()
+        if self._click_sound is not None:
+            self._click_sound = self._click_sound.apply_gain(self.cfg['key_click_gain_db'])
+        self._enter_synth = self.create_enter_sound()
+        # Pool of randomized key clicks for the fallback path; events pick one instead of synthesizing
+        self._click_pool = [c for c in (self.create_random_key_click() for _ in range(32)) if c is not None]
         # Now load key samples (method exists below)
         try:
             self.key_samples = self._load_key_samples()
         except Exception:
             self.key_samples = []
         # Key samples will be loaded after initialization (below) using a method to avoid attribute errors
+        # Decode (and pre-gain) every key sample once so audio events never touch the files
+        self._key_audio = self._load_key_audio()
+        # The enter sample (if one is provided) is decoded once as well
+        self._enter_sample = self._load_enter_sample()
+
+    def _load_cfg(self):
+        """Parse the per-frame / per-event tuning env vars into `self.cfg`.
+        Invalid values fall back to the same defaults the render loop used before.
+        """
+        def env_number(name, default, cast=int, fallback=None):
+            try:
+                return cast(os.getenv(name, default))
+            except Exception:
+                return cast(default) if fallback is None else fallback
+
+        self.cfg = {
+            'frames_per_char_code': env_number('FRAMES_PER_CHAR_CODE', '1', fallback=2),
+            'code_speed_factor': env_number('CODE_SPEED_FACTOR', '1.0', float),
+            'chars_per_frame': env_number('CHARS_PER_FRAME', '1'),
+            'term_typing_frames_per_char': env_number('TERM_TYPING_FRAMES_PER_CHAR', '1'),
+            'term_debug': os.getenv('TERM_DEBUG', '0') == '1',
+            'key_click_gain_db': env_number('KEY_CLICK_GAIN_DB', '-3'),
+            'bg_music_gain_db': env_number('BG_MUSIC_GAIN_DB', '-12'),
+            'key_sample_gain_db': env_number('KEY_SAMPLE_GAIN_DB', '-3', fallback=-6),
+            'key_sample_speed_variation_percent': env_number('KEY_SAMPLE_SPEED_VARIATION_PERCENT', '0.0', float),
+        }
+
+    def _synthesize_tts(self, text, safe_name):
+        """Write the spoken question to audio/ and return the file path.
+        With TTS_ENGINE=piper (and PIPER_MODEL pointing at a voice .onnx) speech is synthesized
+        locally, skipping the per-call HTTPS round trip to Google; otherwise gTTS is used.
+        """
+        if os.getenv('TTS_ENGINE', 'gtts').lower() == 'piper':
+            model = os.getenv('PIPER_MODEL', '')
+            if model and shutil.which('piper'):
+                tts_path = os.path.join(self.audio_dir, f"tts_{safe_name}.wav")
+                try:
+                    subprocess.run(['piper', '--model', model, '--output_file', tts_path],
+                                   input=text, text=True, check=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    return tts_path
+                except Exception as e:
+                    logging.warning(f"piper TTS failed, falling back to gTTS: {e}")
+            else:
+                logging.warning("TTS_ENGINE=piper but piper or PIPER_MODEL is missing; using gTTS")
+        tts_path = os.path.join(self.audio_dir, f"tts_{safe_name}.mp3")
+        gTTS(text=text, lang=self.selected_tts_voice, slow=False).save(tts_path)
+        return tts_path
 
     def _load_key_samples(self):
         """Return a list of file paths to keyboard sound samples under audio/keys/ (mp3/wav/ogg)."""
@@ -221,6 +310,42 @@ class ShortsVideoGenerator:
                 files.append(os.path.join(samples_dir, fname))
         return files
 
+    def _load_key_audio(self):
+        """Decode each key sample once with KEY_SAMPLE_GAIN_DB applied.
+        Returns {path: [AudioSegment, ...]}; when KEY_SAMPLE_SPEED_VARIATION_PERCENT is set the list
+        also holds a few speed-shifted variants so events can pick one instead of resampling per event.
+        """
+        key_audio = {}
+        if not self.audio_enabled:
+            return key_audio
+        variation = max(0.0, self.cfg['key_sample_speed_variation_percent'] / 100.0)
+        # Speeds spread across [-variation, +variation]
+        speeds = [1.0 + variation * k / 2.0 for k in (-2, -1, 1, 2)] if variation > 0.0 else []
+        for path in self.key_samples:
+            try:
+                base = self._read_audio_file(path).apply_gain(self.cfg['key_sample_gain_db'])
+            except Exception as e:
+                logging.warning(f"Failed to load key sample {path}: {e}")
+                continue
+            variants = [base]
+            variants.extend(self._speed_shift(base, speed) for speed in speeds)
+            key_audio[path] = variants
+        return key_audio
+
+    def _speed_shift(self, seg, speed):
+        """Play `seg` back `speed` times faster by linearly resampling its samples with NumPy.
+        Unlike pydub's effects.speedup (chunk slicing and crossfades) this is a single O(n) pass;
+        pitch shifts along with tempo, which is fine for short key clicks.
+        """
+        seg = seg.set_sample_width(2)
+        samples = np.frombuffer(seg.raw_data, dtype=np.int16).reshape(-1, seg.channels)
+        src = np.arange(len(samples))
+        idx = np.arange(0, len(samples), speed)
+        out = np.empty((len(idx), seg.channels), dtype='<i2')
+        for ch in range(seg.channels):
+            out[:, ch] = np.interp(idx, src, samples[:, ch])
+        return seg._spawn(out.tobytes())
+
     def _find_background_file(self):
             candidates = ['background.mp3', 'background.wav', 'background.ogg']
             for c in candidates:
@@ -237,6 +362,32 @@ class ShortsVideoGenerator:
                     return path
             return None
 
+    def _load_enter_sample(self):
+        """Decode audio/enter.* once; returns None when audio is disabled or no sample exists."""
+        enter_file = self._find_enter_sample() if self.audio_enabled else None
+        if not enter_file:
+            return None
+        try:
+            return self._read_audio_file(enter_file)
+        except Exception:
+            return None
+
+    def _read_audio_file(self, path):
+        """Decode an audio file into an AudioSegment.
+        Plain PCM .wav files are read with the wave module, skipping the ffprobe/ffmpeg processes
+        that AudioSegment.from_file spawns; anything else (or an unusual wav) goes through pydub.
+        """
+        if path.lower().endswith('.wav'):
+            try:
+                with wave.open(path, 'rb') as wf:
+                    # 8-bit wavs are unsigned and need pydub's bias handling, so only signed widths here
+                    if wf.getcomptype() == 'NONE' and wf.getsampwidth() in (2, 4):
+                        return AudioSegment(wf.readframes(wf.getnframes()), sample_width=wf.getsampwidth(),
+                                            frame_rate=wf.getframerate(), channels=wf.getnchannels())
+            except (wave.Error, EOFError):
+                pass
+        return AudioSegment.from_file(path)
+
     def get_font(self, size, bold=False):
         try:
             # Try to use a good coding font if available, else default
@@ -245,6 +396,34 @@ class ShortsVideoGenerator:
         except:
             return ImageFont.load_default()
 
+    def _sine_wave(self, freq, duration_ms, gain_db):
+        """NumPy equivalent of `Sine(freq).to_audio_segment(duration_ms).apply_gain(gain_db)` as floats in [-1, 1]."""
+        n = int(self.synth_rate * duration_ms / 1000.0)
+        return np.sin((2 * np.pi * freq / self.synth_rate) * np.arange(n)) * (10 ** (gain_db / 20.0))
+
+    def _white_noise(self, duration_ms, gain_db, rng):
+        """NumPy equivalent of `WhiteNoise().to_audio_segment(duration_ms).apply_gain(gain_db)`."""
+        n = int(self.synth_rate * duration_ms / 1000.0)
+        return (rng.random(n) * 2.0 - 1.0) * (10 ** (gain_db / 20.0))
+
+    def _synth_segment(self, layers, fade_in_ms=0, fade_out_ms=0):
+        """Overlay float `layers` onto the first one (like pydub's overlay, the first layer sets the length),
+        apply linear fades and return the result as a mono 16-bit AudioSegment.
+        """
+        out = layers[0].copy()
+        for layer in layers[1:]:
+            n = min(len(out), len(layer))
+            out[:n] += layer[:n]
+        # Fades are clamped to the sound so a fade longer than the sound covers all of it
+        n_in = min(len(out), int(self.synth_rate * fade_in_ms / 1000.0))
+        if n_in:
+            out[:n_in] *= np.linspace(0.0, 1.0, n_in, endpoint=False)
+        n_out = min(len(out), int(self.synth_rate * fade_out_ms / 1000.0))
+        if n_out:
+            out[len(out) - n_out:] *= np.linspace(1.0, 0.0, n_out)
+        samples = np.clip(out * 32767.0, -32768, 32767).astype('<i2')
+        return AudioSegment(samples.tobytes(), frame_rate=self.synth_rate, sample_width=2, channels=1)
+
     def create_mechanical_click(self):
         """Synthesize a 'thocky' mechanical keyboard sound"""
         # If audio isn't available, just return None to indicate a disabled audio event
@@ -256,19 +435,18 @@ class ShortsVideoGenerator:
         # Body frequency (thock) and a harmonic; lower for deeper key feel
         # add a tiny envelope by layering two low pulses with slightly different lengths
         body_freq = rand.choice([100, 110, 125, 140, 150]) + rand.randint(-3, 3)
-        body = Sine(body_freq).to_audio_segment(duration=90).apply_gain(-16 + rand.randint(-3, 1))
-        body2 = Sine(int(body_freq * 2.02)).to_audio_segment(duration=110).apply_gain(-22 + rand.randint(-2, 2))
+        body = self._sine_wave(body_freq, 90, -16 + rand.randint(-3, 1))
+        body2 = self._sine_wave(int(body_freq * 2.02), 110, -22 + rand.randint(-2, 2))
         # ping transient: high-frequency spike for the 'click' attack
         transient_freq = rand.choice([1600, 2000, 2400, 2800, 3200]) + rand.randint(-50, 50)
         # create a pair of very short transients with slight detune and a fast decay to emulate metallic bite
-        transient = Sine(transient_freq).to_audio_segment(duration=12).apply_gain(-4 + rand.randint(-3, 1))
-        transient2 = Sine(transient_freq + rand.choice([40, 60, 80])).to_audio_segment(duration=10).apply_gain(-8 + rand.randint(-4, 1))
+        transient = self._sine_wave(transient_freq, 12, -4 + rand.randint(-3, 1))
+        transient2 = self._sine_wave(transient_freq + rand.choice([40, 60, 80]), 10, -8 + rand.randint(-4, 1))
         # short noise to make it more organic
-        noise = WhiteNoise().to_audio_segment(duration=45).apply_gain(-30 + rand.randint(-3, 3))
+        noise = self._white_noise(45, -30 + rand.randint(-3, 3), np.random.default_rng(rand.getrandbits(64)))
         # combine with transient variations for more 'click' complexity
-        sound = body.overlay(body2).overlay(transient).overlay(transient2).overlay(noise)
         # Slight fade for natural decay
-        return sound.fade_in(2).fade_out(120)
+        return self._synth_segment([body, body2, transient, transient2, noise], fade_in_ms=2, fade_out_ms=120)
 
     def create_random_key_click(self):
         """Synthesize a short key press sound with randomized parameters to avoid repetition."""
@@ -280,23 +458,21 @@ class ShortsVideoGenerator:
         freq = rand.choice([300, 340, 380, 420, 460, 500]) + rand.randint(-8, 8)
         dur = rand.choice([18, 22, 26, 30, 34])
         # Small two-tone body with detune
-        tone = Sine(freq).to_audio_segment(duration=dur).apply_gain(-14 + rand.randint(-3, 1))
-        tone2 = Sine(int(freq * 1.12)).to_audio_segment(duration=dur + 6).apply_gain(-20 + rand.randint(-3, 1))
-        amber = Sine(int(freq * 0.5)).to_audio_segment(duration=int(dur*1.6)).apply_gain(-26 + rand.randint(-2, 2))
-        click = WhiteNoise().to_audio_segment(duration=max(6, dur//4)).apply_gain(-26 + rand.randint(-3, 2))
-        transient = Sine(rand.choice([2000, 2200, 2600, 3000])).to_audio_segment(duration=8).apply_gain(-7 + rand.randint(-2, 1))
-        sound = tone.overlay(tone2).overlay(amber).overlay(click).overlay(transient)
-        return sound.fade_out(10)
+        tone = self._sine_wave(freq, dur, -14 + rand.randint(-3, 1))
+        tone2 = self._sine_wave(int(freq * 1.12), dur + 6, -20 + rand.randint(-3, 1))
+        amber = self._sine_wave(int(freq * 0.5), int(dur * 1.6), -26 + rand.randint(-2, 2))
+        click = self._white_noise(max(6, dur // 4), -26 + rand.randint(-3, 2), np.random.default_rng(rand.getrandbits(64)))
+        transient = self._sine_wave(rand.choice([2000, 2200, 2600, 3000]), 8, -7 + rand.randint(-2, 1))
+        return self._synth_segment([tone, tone2, amber, click, transient], fade_out_ms=10)
 
     def create_enter_sound(self):
         """Synthesize a heavier enter key sound"""
         if not self.audio_enabled:
             return None
 
-        tone = Sine(300).to_audio_segment(duration=60).apply_gain(-8)
-        click = WhiteNoise().to_audio_segment(duration=30).apply_gain(-16)
-        sound = tone.overlay(click)
-        return sound.fade_out(20)
+        tone = self._sine_wave(300, 60, -8)
+        click = self._white_noise(30, -16, np.random.default_rng())
+        return self._synth_segment([tone, click], fade_out_ms=20)
 
     # legacy single-tone background function removed; we rely on the randomized
     # create_background_music below which is seeded per-call for unique tracks
@@ -308,22 +484,91 @@ class ShortsVideoGenerator:
         if not self.audio_enabled:
             return None
 
-        # Randomize the base frequencies per-call so each video has a different pad
+        # Pick one of a few pad variants per call (seeded with current time) so videos differ,
+        # but each variant is synthesized once and reused by later videos
         rand = random.Random()
-        # Seed with current time to get different sound each call
         rand.seed(time.time_ns())
+        variant = rand.randrange(self.pad_variants)
+        # Pads are cached at a 5 s bucketed length and sliced, so similar durations share one buffer
+        bucket_ms = (int(duration_ms) // 5000 + 1) * 5000
+        pad = self._pad_cache.get(variant)
+        if pad is None or len(pad) < int(self.synth_rate * bucket_ms / 1000.0):
+            pad = self._synthesize_pad(variant, bucket_ms)
+            self._pad_cache[variant] = pad
+        # subtle fade in/out (applied to a copy, the cached pad stays unfaded)
+        return self._synth_segment([pad[:int(self.synth_rate * duration_ms / 1000.0)]], fade_in_ms=500, fade_out_ms=500)
+
+    def _synthesize_pad(self, variant, duration_ms):
+        """Render the unfaded layered pad for `variant` as float32 samples.
+        The variant number seeds the frequencies and gains, so a variant always sounds the same.
+        """
+        rand = random.Random(variant)
         root = rand.choice([60, 90, 110, 130, 150, 180])
         factors = [1, 2, 3]
         freqs = [root * f for f in factors]
-        # Build a layered pad/chord with low gain; small random gain shifts for variation
-        base1 = Sine(freqs[0]).to_audio_segment(duration=duration_ms).apply_gain(-30 + rand.randint(-2, 2))
-        base2 = Sine(freqs[1]).to_audio_segment(duration=duration_ms).apply_gain(-34 + rand.randint(-2, 2))
-        base3 = Sine(freqs[2]).to_audio_segment(duration=duration_ms).apply_gain(-36 + rand.randint(-2, 2))
+        # Build a layered pad/chord with low gain; small random gain shifts for variation.
+        # Layers are summed in place so a long pad never holds more than a couple of full-length buffers.
+        pad = self._sine_wave(freqs[0], duration_ms, -30 + rand.randint(-2, 2))
+        pad += self._sine_wave(freqs[1], duration_ms, -34 + rand.randint(-2, 2))
+        pad += self._sine_wave(freqs[2], duration_ms, -36 + rand.randint(-2, 2))
         # A faint noise bed
-        noise = WhiteNoise().to_audio_segment(duration=duration_ms).apply_gain(-50 + rand.randint(-2, 2))
-        music = base1.overlay(base2).overlay(base3).overlay(noise)
-        # subtle fade in/out
-        return music.fade_in(500).fade_out(500)
+        pad += self._white_noise(duration_ms, -50 + rand.randint(-2, 2), np.random.default_rng(rand.getrandbits(64)))
+        return pad.astype(np.float32)
+
+    def _mixdown(self, duration_ms, layers):
+        """Mix `(position_ms, segment, gain_db)` layers into a single AudioSegment of `duration_ms`.
+        All layers are summed into one int32 NumPy buffer and clipped to 16-bit once at the end,
+        so the cost is proportional to the layer lengths rather than to the full track per layer.
+        """
+        if not layers:
+            return AudioSegment.silent(duration=duration_ms)
+
+        frame_rate = max(seg.frame_rate for _, seg, _ in layers)
+        channels = max(seg.channels for _, seg, _ in layers)
+        mix = np.zeros(int(duration_ms * frame_rate / 1000) * channels, dtype=np.int32)
+
+        # Segments reused by many events (clicks, key samples) are converted only once, and each
+        # (segment, gain) pair is scaled to int32 once, so every event is a plain slice add
+        converted = {}
+        scaled = {}
+        for position_ms, seg, gain_db in layers:
+            start = int(position_ms * frame_rate / 1000) * channels
+            if start >= len(mix):
+                continue
+            samples = scaled.get((id(seg), gain_db))
+            if samples is None:
+                raw = converted.get(id(seg))
+                if raw is None:
+                    synced = seg.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(2)
+                    raw = np.frombuffer(synced.raw_data, dtype=np.int16)
+                    converted[id(seg)] = raw
+                if gain_db:
+                    samples = (raw * (10 ** (gain_db / 20.0))).astype(np.int32)
+                else:
+                    samples = raw.astype(np.int32)
+                scaled[(id(seg), gain_db)] = samples
+            chunk = samples[:len(mix) - start]
+            mix[start:start + len(chunk)] += chunk
+
+        np.clip(mix, -32768, 32767, out=mix)
+        return AudioSegment(mix.astype('<i2').tobytes(), frame_rate=frame_rate, sample_width=2, channels=channels)
+
+    def _load_background_track(self, path, duration_ms, gain_db=0, loop=True):
+        """Decode `path` into an AudioSegment of at most `duration_ms` with one ffmpeg call.
+        Looping, trimming and gain run inside the ffmpeg filter graph instead of as pydub
+        concatenation/slicing, which would copy the whole track for every step.
+        """
+        cmd = ['ffmpeg', '-v', 'error']
+        if loop:
+            cmd += ['-stream_loop', '-1']
+        cmd += [
+            '-i', path,
+            '-t', f"{duration_ms / 1000.0:.3f}",
+            '-af', f"volume={gain_db}dB",
+            '-f', 's16le', '-ac', '2', '-ar', '44100', 'pipe:1'
+        ]
+        raw = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+        return AudioSegment(raw, frame_rate=44100, sample_width=2, channels=2)
 
     def tokenize_code(self, line):
         """Tokenize a code line into [(token, type), ...] for colorized rendering.
@@ -332,24 +577,9 @@ class ShortsVideoGenerator:
         if not line:
             return []
 
-        # Broadened token specs to handle Java, C#, Go, Python, JS common keywords and patterns
-        token_specs = [
-              ('builtin', r"\b(len|print|println|printf|append|push|pop|map|filter|reduce|range|make|fmt\.Println|fmt\.Printf|console\.log|System\.out\.println|toString|parseInt|parseFloat|JSON\.stringify)\b"),
-              ('keyword', r"\b(function|const|let|var|return|if|else|for|while|switch|case|break|continue|try|catch|finally|throw|await|async|import|from|class|new|this|super|extends|implements|interface|package|public|private|protected|static|final|void|int|long|short|byte|char|boolean|true|false|null)\b"),
-              ('string', r'(".*?"|\'.*?\')'),
-              ('number', r'\b(\d+(?:\.\d+)?)\b'),
-              ('comment', r'(//.*|/\*[\s\S]*?\*/|#.*)'),
-              ('operator', r'([+\-*/%=<>!&|:^~]+)'),
-              ('function', r'(\b\w+)(?=\()'),
-              ('bracket', r'([(){}\[\];,])')
-        ]
-
-        combined = '|'.join(f"(?P<{name}>{pattern})" for name, pattern in token_specs)
-        regex = re.compile(combined)
-
         tokens = []
         last_end = 0
-        for m in regex.finditer(line):
+        for m in _TOKEN_RE.finditer(line):
             if m.start() > last_end:
                 tokens.append((line[last_end:m.start()], 'default'))
             gname = m.lastgroup
@@ -359,6 +589,98 @@ class ShortsVideoGenerator:
             tokens.append((line[last_end:], 'default'))
         return tokens
 
+    def _char_widths(self, font):
+        """Return a float32 table with the advance width of code points 0-255 in `font`.
+        Tables are built once per font face/size and reused for every measurement.
+        """
+        key = (getattr(font, 'path', None), getattr(font, 'size', None))
+        table = self._char_width_tables.get(key)
+        if table is None:
+            table = np.array([font.getlength(chr(c)) for c in range(256)], dtype=np.float32)
+            self._char_width_tables[key] = table
+        return table
+
+    def _cell_width(self, font):
+        """Return the shared advance width of printable ASCII in `font`, or None if it is proportional."""
+        key = (getattr(font, 'path', None), getattr(font, 'size', None))
+        if key not in self._cell_widths:
+            widths = self._char_widths(font)[32:127]
+            self._cell_widths[key] = float(widths[0]) if (widths == widths[0]).all() else None
+        return self._cell_widths[key]
+
+    def _char_advances(self, text, font):
+        """Return the advance width of every character of `text` as a NumPy array.
+        Latin-1 text is a single table lookup; other characters are measured with font.getlength.
+        """
+        try:
+            codes = np.frombuffer(text.encode('latin-1'), dtype=np.uint8)
+        except UnicodeEncodeError:
+            return np.array([font.getlength(ch) for ch in text], dtype=np.float32)
+        return self._char_widths(font)[codes]
+
+    def _text_width(self, text, font):
+        """Measure `text` in pixels by summing cached per-character widths."""
+        # Monospace fast path: printable ASCII is just a character count
+        cell = self._cell_width(font)
+        if cell is not None and text.isascii() and text.isprintable():
+            return len(text) * cell
+        return float(self._char_advances(text, font).sum())
+
+    def _glyph(self, ch, font):
+        """Return the cached `(mask, (dx, dy))` rasterization of a single character.
+        `mask` is an 'L' coverage image (None for blank glyphs) to be placed at the pen
+        position plus `(dx, dy)`; FreeType only renders each character once per font.
+        """
+        key = (getattr(font, 'path', None), getattr(font, 'size', None), ch)
+        glyph = self._glyph_cache.get(key)
+        if glyph is None:
+            left, top, right, bottom = font.getbbox(ch)
+            if right <= left or bottom <= top:
+                glyph = (None, (0, 0))
+            else:
+                mask = Image.new('L', (right - left, bottom - top), 0)
+                ImageDraw.Draw(mask).text((-left, -top), ch, font=font, fill=255)
+                glyph = (mask, (left, top))
+            self._glyph_cache[key] = glyph
+        return glyph
+
+    def _paste_text(self, img, xy, text, font, color):
+        """Draw `text` onto `img` by pasting cached glyph masks in `color`.
+        Returns the x position just after the text.
+        """
+        x, y = xy
+        for ch, advance in zip(text, self._char_advances(text, font).tolist()):
+            mask, (dx, dy) = self._glyph(ch, font)
+            if mask is not None:
+                img.paste(color, (int(x) + dx, int(y) + dy), mask)
+            x += advance
+        return x
+
+    def _stash_glyph_area(self, img, xy, ch, font):
+        """Return `(patch, (x, y))` with the pixels of `img` that pasting `ch` at `xy` would cover,
+        so an overlay such as the cursor can be undone with `img.paste(*stash)`; None for blank glyphs.
+        """
+        mask, (dx, dy) = self._glyph(ch, font)
+        if mask is None:
+            return None
+        x, y = int(xy[0]) + dx, int(xy[1]) + dy
+        return img.crop((x, y, x + mask.width, y + mask.height)), (x, y)
+
+    def _split_by_width(self, text, font, max_width, offset=0.0):
+        """Greedily split `text` into pieces that fit in `max_width` pixels after `offset` pixels
+        (e.g. indentation). Break points are found by binary search over cumulative character widths;
+        every piece holds at least one character, so an over-wide glyph still gets a piece of its own.
+        """
+        cum = np.cumsum(self._char_advances(text, font), dtype=np.float64)
+        pieces = []
+        start = 0
+        while start < len(text):
+            consumed = cum[start - 1] if start else 0.0
+            end = max(start + 1, int(np.searchsorted(cum, consumed + max_width - offset, side='right')))
+            pieces.append(text[start:end])
+            start = end
+        return pieces
+
     def wrap_line_by_width(self, draw, line, font, max_width):
         """Wrap a single line of text into multiple lines so that each fits within max_width (pixels).
         Returns a list of wrapped lines.
@@ -371,27 +693,18 @@ class ShortsVideoGenerator:
         current = ''
         for w in words:
             candidate = w if current == '' else f"{current} {w}"
-            if draw.textlength(candidate, font=font) <= max_width:
+            if self._text_width(candidate, font) <= max_width:
                 current = candidate
             else:
                 if current:
                     lines.append(current)
                 # if single word too long for the width, split by character approx
-                if draw.textlength(w, font=font) <= max_width:
+                if self._text_width(w, font) <= max_width:
                     current = w
                 else:
-                    part = ''
-                    for ch in w:
-                        if draw.textlength(part + ch, font=font) <= max_width:
-                            part += ch
-                        else:
-                            if part:
-                                lines.append(part)
-                            part = ch
-                    if part:
-                        current = part
-                    else:
-                        current = ''
+                    pieces = self._split_by_width(w, font, max_width)
+                    lines.extend(pieces[:-1])
+                    current = pieces[-1]
         if current != '':
             lines.append(current)
         return lines
@@ -417,6 +730,8 @@ class ShortsVideoGenerator:
         # 2. Audio Setup (TTS)
         # Generate TTS only when audio generation is enabled
         tts_path = None
+        # Decoded TTS audio, kept so the mixer does not decode the file a second time
+        tts_audio = None
         # Deterministic fallback duration per character (ms) when TTS audio not available.
         try:
             base_ms_per_char = float(os.getenv('BASE_MS_PER_CHAR', '55'))
@@ -427,16 +742,14 @@ class ShortsVideoGenerator:
         if self.audio_enabled and not lightweight:
             try:
                 print("🗣️ Generating TTS...")
-                tts = gTTS(text=question, lang=self.selected_tts_voice, slow=False)
                 # Use a per-file tts path to avoid collisions when multiple jobs run concurrently
                 safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', filename)
-                tts_path = os.path.join(self.audio_dir, f"tts_{safe_name}.mp3")
-                tts.save(tts_path)
+                tts_path = self._synthesize_tts(question, safe_name)
                 # Validate file non-empty
                 try:
                     if os.path.exists(tts_path) and os.path.getsize(tts_path) > 100:
                         try:
-                            tts_audio = AudioSegment.from_mp3(tts_path)
+                            tts_audio = AudioSegment.from_file(tts_path)
                             tts_duration_ms = len(tts_audio)
                         except Exception as e:
                             logging.warning(f"TTS saved but failed to load with pydub: {e}")
@@ -481,7 +794,7 @@ class ShortsVideoGenerator:
                 from pydub import effects
                 tts_audio = effects.speedup(tts_audio, playback_speed=speedup)
                 # overwrite the tts file with the sped-up version
-                tts_audio.export(tts_path, format='mp3')
+                tts_audio.export(tts_path, format=os.path.splitext(tts_path)[1].lstrip('.') or 'mp3')
                 tts_duration_ms = len(tts_audio)
             except Exception:
                 # Fallback: adjust perceived duration numerically
@@ -507,260 +820,235 @@ class ShortsVideoGenerator:
             ms_per_char_question *= 2  # Slower typing for fade effect
         frames_per_char_question = max(1, int((ms_per_char_question / 1000) * self.fps))
 
-        # Stream frames directly to disk to avoid keeping all frames in memory
+        # Stream frames directly to disk to avoid keeping all frames in memory.
+        # With ffmpeg available, raw RGB frames are piped straight into an x264 encoder;
+        # otherwise fall back to OpenCV's VideoWriter.
         temp_video = os.path.join(self.output_dir, f"temp_vid_{safe_name}.mp4")
-        out = cv2.VideoWriter(temp_video, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (self.width, self.height))
-        frame_count = 0
-        last_frame_img = None
-
-        def append_frame(img, repeats=1):
-            nonlocal frame_count, last_frame_img
-            bgr = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-            for _ in range(repeats):
-                out.write(bgr)
-                frame_count += 1
-            last_frame_img = img
+        # The result screen closes the video; ffmpeg clones its frame for the hold (tpad)
+        # instead of receiving the same bytes again through the pipe.
+        result_hold_frames = 90
+        video_proc = None
+        out = None
+        if self.ffmpeg_available:
+            video_preset = os.getenv('VIDEO_PRESET', 'ultrafast')
+            video_proc = subprocess.Popen([
+                'ffmpeg', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                '-s', f"{self.width}x{self.height}", '-r', str(self.fps), '-i', 'pipe:',
+                '-vf', f"tpad=stop_mode=clone:stop={result_hold_frames - 1}",
+                '-c:v', 'libx264', '-preset', video_preset, '-pix_fmt', 'yuv420p', temp_video
+            ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            out = cv2.VideoWriter(temp_video, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (self.width, self.height))
+
+        # Pipe writes happen on a background thread behind a small bounded queue, so the next
+        # frame is rendered while x264 is still consuming the previous one
+        frame_queue = None
+        writer_thread = None
+        writer_errors = []
+        if video_proc is not None:
+            frame_queue = queue.Queue(maxsize=8)
+
+            def pipe_writer():
+                while True:
+                    item = frame_queue.get()
+                    if item is None:
+                        break
+                    if writer_errors:
+                        # Keep draining so the renderer never blocks on a dead encoder
+                        continue
+                    frame, repeats = item
+                    try:
+                        for _ in range(repeats):
+                            video_proc.stdin.write(frame)
+                    except Exception as e:
+                        writer_errors.append(e)
+
+            writer_thread = threading.Thread(target=pipe_writer, daemon=True)
+            writer_thread.start()
+
+        def abort_encoder():
+            # Tear the encoder down after a failed render so no ffmpeg process, writer thread or
+            # queued frame buffers outlive this call
+            if video_proc is not None:
+                frame_queue.put(None)
+                writer_thread.join()
+                video_proc.kill()
+                video_proc.wait()
+                with contextlib.suppress(Exception):
+                    video_proc.stdin.close()
+            elif out is not None:
+                out.release()
+            with contextlib.suppress(OSError):
+                os.remove(temp_video)
+
+        try:
+            frame_count = 0
+            # Last frame in the writer's format (a raw RGB buffer for the pipe, a BGR array for OpenCV),
+            # kept so holds can repeat it without serializing the image again
+            last_frame = None
+
+            def write_frame(frame, repeats):
+                nonlocal frame_count
+                if frame_queue is not None:
+                    frame_queue.put((frame, repeats))
+                else:
+                    for _ in range(repeats):
+                        out.write(frame)
+                frame_count += repeats
+
+            def encode_frame(img):
+                # Serialize a PIL image (or an RGB uint8 array) into the writer's format
+                if video_proc is not None:
+                    # PIL images and NumPy arrays both serialize to raw RGB bytes with tobytes()
+                    return img.tobytes()
+                return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+
+            def append_frame(img, repeats=1):
+                nonlocal last_frame
+                last_frame = encode_frame(img)
+                write_frame(last_frame, repeats)
+
+            def hold_last_frame(repeats):
+                if last_frame is not None:
+                    write_frame(last_frame, repeats)
+
+            def hold_final_frame(img, repeats):
+                # Must be the last frame written: ffmpeg pads the stream with `repeats - 1` clones
+                nonlocal frame_count
+                if video_proc is not None:
+                    append_frame(img, 1)
+                    frame_count += repeats - 1
+                else:
+                    append_frame(img, repeats)
         
-        # --- VISUAL CONFIG ---
-        # Huge Fonts
-        font_code = self.get_font(48) 
-        font_question = self.get_font(55, bold=True)
-        font_header = self.get_font(40)
-        font_terminal = self.get_font(42)
+            # --- VISUAL CONFIG ---
+            # Huge Fonts
+            font_code = self.get_font(48) 
+            font_question = self.get_font(55, bold=True)
+            font_header = self.get_font(40)
+            font_terminal = self.get_font(42)
         
-        margin_x = 120
-        header_y = 100
-        question_y = 200
-        code_y = 380 # Start code lower to give space for question
-        # Width reserved for line numbers (pixels). Increase for extra space to the right of numbers.
-        try:
-            line_number_area_width = int(os.getenv('LINE_NUMBER_AREA_WIDTH', '120'))
-        except Exception:
-            line_number_area_width = 120
-        code_x = margin_x + line_number_area_width
-        try:
-            right_padding = int(os.getenv('RIGHT_PADDING', '60'))
-        except Exception:
-            right_padding = 60
+            margin_x = 120
+            header_y = 100
+            question_y = 200
+            code_y = 380 # Start code lower to give space for question
+            # Width reserved for line numbers (pixels). Increase for extra space to the right of numbers.
+            try:
+                line_number_area_width = int(os.getenv('LINE_NUMBER_AREA_WIDTH', '120'))
+            except Exception:
+                line_number_area_width = 120
+            code_x = margin_x + line_number_area_width
+            try:
+                right_padding = int(os.getenv('RIGHT_PADDING', '60'))
+            except Exception:
+                right_padding = 60
         
-        # --- PHASE 1: HEADER & BACKGROUND ---
-        def create_bg():
-            img = Image.new('RGB', (self.width, self.height), self.bg_color)
-            draw = ImageDraw.Draw(img)
-            
+            # --- PHASE 1: HEADER & BACKGROUND ---
+            # The background is identical for every frame of this video, so draw it once
+            # and hand out copies.
+            bg_template = Image.new('RGB', (self.width, self.height), self.bg_color)
+            bg_draw = ImageDraw.Draw(bg_template)
+
             # Mac Dots (Huge)
             dot_size = 40
             dot_spacing = 80
             start_x = margin_x
             for i, color in enumerate(self.mac_colors):
                 x = start_x + (i * dot_spacing)
-                draw.ellipse([x, header_y, x + dot_size, header_y + dot_size], fill=color)
-            
+                bg_draw.ellipse([x, header_y, x + dot_size, header_y + dot_size], fill=color)
+
             # Filename
-            draw.text((self.width//2 - 100, header_y - 5), f"index.{self.language_extensions[self.selected_language]}", font=font_header, fill=self.colors['comment'])
-            return img, draw
+            bg_draw.text((self.width//2 - 100, header_y - 5), f"index.{self.language_extensions[self.selected_language]}", font=font_header, fill=self.colors['comment'])
 
-        # --- PHASE 2: QUESTION TYPING (Synced with TTS) ---
-        wrapped_question = textwrap.wrap(question, width=25) # Narrow width for huge text
+            def create_bg():
+                img = bg_template.copy()
+                return img, ImageDraw.Draw(img)
+
+            # --- PHASE 2: QUESTION TYPING (Synced with TTS) ---
+            wrapped_question = textwrap.wrap(question, width=25) # Narrow width for huge text
         
-        current_q_text = ""
-        q_char_count = 0
+            current_q_text = ""
+            q_char_count = 0
         
-        audio_events = []
-        if tts_path:
-            audio_events.append((0, 'tts', tts_path))
-        # Throttle key audio events so short samples don't create a rapid-fire impression.
-        try:
-            key_min_interval_ms = int(os.getenv('KEY_MIN_INTERVAL_MS', '60'))
-        except Exception:
-            key_min_interval_ms = 60
-        last_key_event_ms = -999999
+            audio_events = []
+            if tts_path:
+                audio_events.append((0, 'tts', tts_path))
+            # Throttle key audio events so short samples don't create a rapid-fire impression.
+            try:
+                key_min_interval_ms = int(os.getenv('KEY_MIN_INTERVAL_MS', '60'))
+            except Exception:
+                key_min_interval_ms = 60
+            last_key_event_ms = -999999
         
-        # Flatten wrapped lines for typing calculation
-        flat_question = "\n".join(wrapped_question)
+            # Flatten wrapped lines for typing calculation
+            flat_question = "\n".join(wrapped_question)
         
-        # We'll compute a dynamic code start Y after we know the question height
-        # Create a temporary draw context to measure text height
-        img_tmp, draw_tmp = create_bg()
-        q_line_h = draw_tmp.textbbox((0,0), "Ay", font=font_question)[3] - draw_tmp.textbbox((0,0), "Ay", font=font_question)[1]
-        question_height_px = q_line_h * max(1, len(wrapped_question)) + 20
-        # Allow configurable gap between the question block and the code block
-        try:
-            question_code_gap = int(os.getenv('QUESTION_CODE_GAP', '60'))
-        except Exception:
-            question_code_gap = 60
-        code_y = question_y + question_height_px + question_code_gap
-
-        slide_offset = 50 if self.selected_style == 'slide_up' else 0
-        char_count = 0
-
-        # Distribute frames per character so typing finishes exactly when TTS audio finishes.
-        total_chars = len(flat_question)
-        total_frames_available = max(1, int((tts_duration_ms / 1000.0) * self.fps))
-        base_frames = total_frames_available // max(1, total_chars)
-        remainder = total_frames_available - (base_frames * max(1, total_chars))
-        frames_per_char_list = [base_frames + (1 if i < remainder else 0) for i in range(total_chars)]
-
-        for idx, char in enumerate(flat_question):
+            # We'll compute a dynamic code start Y after we know the question height
+            # Measure on the template's draw object instead of copying a full frame just for a bbox
+            q_bbox = bg_draw.textbbox((0, 0), "Ay", font=font_question)
+            q_line_h = q_bbox[3] - q_bbox[1]
+            question_height_px = q_line_h * max(1, len(wrapped_question)) + 20
+            # Allow configurable gap between the question block and the code block
+            try:
+                question_code_gap = int(os.getenv('QUESTION_CODE_GAP', '60'))
+            except Exception:
+                question_code_gap = 60
+            code_y = question_y + question_height_px + question_code_gap
+
+            slide_offset = 50 if self.selected_style == 'slide_up' else 0
+            char_count = 0
+
+            # Distribute frames per character so typing finishes exactly when TTS audio finishes.
+            total_chars = len(flat_question)
+            total_frames_available = max(1, int((tts_duration_ms / 1000.0) * self.fps))
+            base_frames = total_frames_available // max(1, total_chars)
+            remainder = total_frames_available - (base_frames * max(1, total_chars))
+            frames_per_char_list = [base_frames + (1 if i < remainder else 0) for i in range(total_chars)]
+
+            # The question is typed onto one persistent canvas: each step undoes the cursor (restoring
+            # the pixels stashed under it), pastes only the new glyph and draws the cursor again.
+            # A full redraw is only needed while the slide_up offset is still moving.
             img, draw = create_bg()
-
-            # Draw typed question so far
-            current_q_text += char
-            char_count += 1
-
-            # Update slide for slide_up style
-            if self.selected_style == 'slide_up':
-                slide_offset = max(0, 50 - (char_count * 1))  # Slide up 1 pixel per char
-
-            # Re-wrap the current text to draw it correctly line by line
-            curr_lines = current_q_text.split('\n')
-
-            y = question_y + slide_offset
-            for line in curr_lines:
-                draw.text((margin_x, y), line, font=font_question, fill=self.selected_question_color)
-                y += 80
-
-            # Cursor (use terminal-neutral cursor style for question area)
-            cursor_pos = draw.textlength(curr_lines[-1], font=font_question)
-            draw.text((margin_x + cursor_pos, y - 80), self.selected_cursor, font=font_question, fill=self.colors['cursor'])
-
-            # Add frames (streamed) - distributed per character
-            repeats = frames_per_char_list[idx] if idx < len(frames_per_char_list) else base_frames
-            repeats = max(1, repeats)
-            append_frame(img, repeats)
-
-            # Key sound events: append 'key' event (sample index) or fall back to click
-            if char.strip() and self.audio_enabled and not lightweight:
-                time_ms = int((frame_count / self.fps) * 1000)
-                if time_ms - last_key_event_ms >= key_min_interval_ms:
-                    if self.key_samples:
-                        sample_idx = random.randrange(0, len(self.key_samples))
-                        audio_events.append((time_ms, 'key', sample_idx))
-                    else:
-                        audio_events.append((time_ms, 'key', None))
-                    last_key_event_ms = time_ms
-
-        # Hold after question (repeat last written frame)
-        if last_frame_img is not None:
-            append_frame(last_frame_img, 15)
-
-        # --- PHASE 3: CODE TYPING ---
-        code_lines = code.split('\n')
-        # Build wrapped code lines to prevent visual overflow in the video
-        img_tmp, draw_tmp = create_bg()
-        max_code_width_px = self.width - margin_x - 60 - margin_x
-
-        def wrap_code_line(draw, text, font, max_px):
-            # Preserve indentation
-            leading_ws = re.match(r"^(\s*)", text).group(1)
-            stripped = text[len(leading_ws):]
-            if not stripped:
-                return [leading_ws]
-
-            tokens = re.split(r"(\s+)", stripped)
-            lines = []
-            curr = leading_ws
-            for token in tokens:
-                # If token alone is too large, break it into characters
-                if draw.textlength(curr + token, font=font) <= max_px:
-                    curr += token
-                else:
-                    if curr.strip() or curr != leading_ws:
-                        lines.append(curr)
-                    # If token itself is too long, break by character
-                    if draw.textlength(leading_ws + token, font=font) > max_px:
-                        piece = ''
-                        for ch in token:
-                            if draw.textlength(leading_ws + piece + ch, font=font) <= max_px:
-                                piece += ch
-                            else:
-                                lines.append(leading_ws + piece)
-                                piece = ch
-                        if piece:
-                            curr = leading_ws + piece
-                        else:
-                            curr = leading_ws
-                    else:
-                        curr = leading_ws + token.lstrip()
-            if curr.strip() or curr != leading_ws:
-                lines.append(curr)
-            return lines
-
-        wrapped_code_lines = []
-        for l in code_lines:
-            sub = wrap_code_line(draw_tmp, l, font_code, max_code_width_px)
-            wrapped_code_lines.extend(sub)
-        current_code_lines = []
-        
-        # Faster typing for code (user adjustable). Base frames per char can be tuned with FRAMES_PER_CHAR_CODE
-        try:
-            base_frames_per_char_code = int(os.getenv('FRAMES_PER_CHAR_CODE', '1'))
-        except Exception:
-            base_frames_per_char_code = 2
-        # Scale code typing speed with SPEEDUP_FACTOR (higher -> fewer frames per char) and allow a code-specific speed factor
-        try:
-            code_speed_factor = float(os.getenv('CODE_SPEED_FACTOR', '1.0'))
-        except Exception:
-            code_speed_factor = 1.0
-        try:
-            frames_per_char_code = max(1, int(base_frames_per_char_code / max(0.01, (speedup * code_speed_factor))))
-        except Exception:
-            frames_per_char_code = max(1, int(base_frames_per_char_code))
-        
-        for line_idx, line in enumerate(wrapped_code_lines):
-            current_code_lines.append("")
-            
-            # Indentation
-            indent = len(line) - len(line.lstrip())
-            current_code_lines[-1] = " " * indent
-            
-            for char in line[len(" " * indent):]:
-                img, draw = create_bg()
-                
-                # Draw Question (Static)
-                y = question_y
-                for q_line in wrapped_question:
-                    draw.text((margin_x, y), q_line, font=font_question, fill=self.selected_question_color)
-                    y += 80
-                
-                # Draw Code
-                current_code_lines[-1] += char
-                
-                cy = code_y
-                for idx, c_line in enumerate(current_code_lines):
-                    wrapped_sub = wrap_code_line(draw, c_line, font_code, max_code_width_px)
-                    # Simple syntax highlighting (Keyword detection for whole words)
-                    # For char-by-char, we just draw the whole line for now to keep it stable
-                    # A full lexer for partial lines is complex, so we'll colorize fully typed words
-                    # and keep current word white
-                    
-                    # Draw line number
-                    # draw.text((margin_x, cy), "1", font=font_code, fill=self.colors['comment'])
-                    
-                    # Draw code text (handle wrapped lines)
-                    for wi, sub in enumerate(wrapped_sub):
-                        # Draw line number only for the first wrapped subline
-                        if wi == 0:
-                            line_num = str(idx + 1)
-                            draw.text((margin_x, cy), line_num, font=font_code, fill=self.colors['comment'])
-                        # Colorize via tokens
-                        tokens = self.tokenize_code(sub)
-                        x = code_x
-                        for token, typ in tokens:
-                            color = self.colors.get(typ, self.text_color)
-                            draw.text((x, cy), token, font=font_code, fill=color)
-                            x += draw.textlength(token, font=font_code)
-                        cy += 70
-                
-                # Cursor
-                # Compute cursor position considering wrapping of the last line
-                last_wrapped = wrap_code_line(draw, current_code_lines[-1], font_code, max_code_width_px)
-                last_line_width = draw.textlength(last_wrapped[-1], font=font_code) if last_wrapped else 0
-                draw.text((code_x + last_line_width, cy - 70), self.cursor_style, font=font_code, fill=self.colors['cursor'])
-                
-                append_frame(img, frames_per_char_code)
-                
-                # Key sound events for code typing
+            drawn_offset = None
+            cursor_stash = None
+            for idx, char in enumerate(flat_question):
+                # Draw typed question so far
+                current_q_text += char
+                char_count += 1
+
+                # Update slide for slide_up style
+                if self.selected_style == 'slide_up':
+                    slide_offset = max(0, 50 - (char_count * 1))  # Slide up 1 pixel per char
+
+                curr_lines = current_q_text.split('\n')
+                line_y = question_y + slide_offset + 80 * (len(curr_lines) - 1)
+
+                if cursor_stash is not None:
+                    img.paste(*cursor_stash)
+                if slide_offset != drawn_offset:
+                    img.paste(bg_template)
+                    y = question_y + slide_offset
+                    for line in curr_lines:
+                        # Cached glyph masks: each question character is rasterized once, not once per frame
+                        self._paste_text(img, (margin_x, y), line, font_question, self.selected_question_color)
+                        y += 80
+                    drawn_offset = slide_offset
+                elif char != '\n':
+                    char_x = margin_x + self._text_width(curr_lines[-1][:-1], font_question)
+                    self._paste_text(img, (char_x, line_y), char, font_question, self.selected_question_color)
+
+                # Cursor (use terminal-neutral cursor style for question area)
+                cursor_pos = self._text_width(curr_lines[-1], font_question)
+                cursor_xy = (margin_x + cursor_pos, line_y)
+                cursor_stash = self._stash_glyph_area(img, cursor_xy, self.selected_cursor, font_question)
+                self._paste_text(img, cursor_xy, self.selected_cursor, font_question, self.colors['cursor'])
+
+                # Add frames (streamed) - distributed per character
+                repeats = frames_per_char_list[idx] if idx < len(frames_per_char_list) else base_frames
+                repeats = max(1, repeats)
+                append_frame(img, repeats)
+
+                # Key sound events: append 'key' event (sample index) or fall back to click
                 if char.strip() and self.audio_enabled and not lightweight:
                     time_ms = int((frame_count / self.fps) * 1000)
                     if time_ms - last_key_event_ms >= key_min_interval_ms:
@@ -770,227 +1058,370 @@ class ShortsVideoGenerator:
                         else:
                             audio_events.append((time_ms, 'key', None))
                         last_key_event_ms = time_ms
-            
-            # Newline pause - repeat the last written frame a few times
-            if last_frame_img is not None:
-                append_frame(last_frame_img, 5)
 
-    # No enter/keyboard sounds: omit enter sound
-        
-        # --- PHASE 4: TERMINAL EXECUTION ---
-        # --- PHASE 4: TERMINAL EXECUTION ---
-        # Terminal slide animation: randomly choose an entry direction: up, left, right
-        try:
-            term_height = int(os.getenv('TERM_HEIGHT_PX', '600'))
-        except Exception:
-            term_height = 600
-        # Allow a global bottom offset so terminal doesn't touch very bottom of video
-        try:
-            term_global_bottom_offset = int(os.getenv('TERM_GLOBAL_BOTTOM_OFFSET_PX', '0'))
-        except Exception:
-            term_global_bottom_offset = 12
-        # Terminal padding from each side (overrides/augments inner padding)
-        try:
-            term_pad_left = int(os.getenv('TERM_PAD_LEFT_PX', '40'))
-        except Exception:
-            term_pad_left = 12
-        try:
-            term_pad_right = int(os.getenv('TERM_PAD_RIGHT_PX', '40'))
-        except Exception:
-            term_pad_right = 12
-        try:
-            term_pad_top = int(os.getenv('TERM_PAD_TOP_PX', '12'))
-        except Exception:
-            term_pad_top = 12
-        try:
-            term_pad_bottom = int(os.getenv('TERM_PAD_BOTTOM_PX', '24'))
-        except Exception:
-            term_pad_bottom = 24
-
-
-        term_y_end = self.height - term_height - term_global_bottom_offset
-        # Random slide direction (up, left, right)
-        directions = ['up', 'left', 'right']
-        term_direction = random.choice(directions)
-
-        # Terminal theme colors
-        t_bg = self.terminal_theme.get('bg', (20, 20, 20))
-        t_header_bg = self.terminal_theme.get('header_bg', (40, 40, 40))
-        t_text = self.terminal_theme.get('text', (220, 220, 220))
-        t_accent = self.terminal_theme.get('accent', (80, 200, 120))
-        t_cursor_color = self.terminal_theme.get('cursor', t_accent)
-        # Inner padding inside the terminal box (small, to avoid large left gaps)
-        term_inner_pad = int(os.getenv('TERM_INNER_PADDING_PX', '16'))
-        # Right padding inside terminal to keep text away from edge
-        term_inner_right = int(os.getenv('TERM_INNER_RIGHT_PX', '72'))
-        # Bottom padding inside terminal so logs don't touch the bottom edge
-        term_bottom_pad = int(os.getenv('TERM_BOTTOM_PADDING_PX', '24'))
-        # Normalize: keep a single bottom padding variable
-        term_pad_bottom = term_pad_bottom if 'term_pad_bottom' in locals() else term_bottom_pad
-        # Header height for terminal (pixels)
-        term_header_h = int(os.getenv('TERM_HEADER_HEIGHT_PX', '60'))
-        # Header left-specific padding
-        term_header_left_pad = int(os.getenv('TERM_HEADER_LEFT_PAD_PX', '72'))
-
-        # Final terminal X (anchored to left when slide finishes). If you change slide logic
-        # to place the terminal elsewhere, update this accordingly.
-        final_term_x = 0
-
-        def terminal_wrap(draw, text, font, max_px):
-            """Wrap `text` into a list of lines that fit within max_px using draw.textlength measurements."""
-            if not text:
-                return [""]
-            words = text.split(' ')
-            lines = []
-            current = words[0]
-            for w in words[1:]:
-                candidate = current + ' ' + w
-                if draw.textlength(candidate, font=font) <= max_px:
-                    current = candidate
-                else:
-                    lines.append(current)
-                    current = w
-            if current:
-                lines.append(current)
-            # As a safety, if any line still exceeds max_px, break by characters
-            final_lines = []
-            for ln in lines:
-                if draw.textlength(ln, font=font) <= max_px:
-                    final_lines.append(ln)
-                else:
-                    part = ''
-                    for ch in ln:
-                        if draw.textlength(part + ch, font=font) <= max_px:
-                            part += ch
+            # Hold after question (repeat last written frame)
+            hold_last_frame(15)
+
+            # --- PHASE 3: CODE TYPING ---
+            code_lines = code.split('\n')
+            # Build wrapped code lines to prevent visual overflow in the video
+            max_code_width_px = self.width - margin_x - 60 - margin_x
+
+            def wrap_code_line(draw, text, font, max_px):
+                # Preserve indentation
+                leading_ws = re.match(r"^(\s*)", text).group(1)
+                stripped = text[len(leading_ws):]
+                if not stripped:
+                    return [leading_ws]
+
+                tokens = re.split(r"(\s+)", stripped)
+                lines = []
+                curr = leading_ws
+                for token in tokens:
+                    # If token alone is too large, break it into characters
+                    if self._text_width(curr + token, font) <= max_px:
+                        curr += token
+                    else:
+                        if curr.strip() or curr != leading_ws:
+                            lines.append(curr)
+                        # If token itself is too long, break by character
+                        if self._text_width(leading_ws + token, font) > max_px:
+                            indent_px = self._text_width(leading_ws, font)
+                            pieces = self._split_by_width(token, font, max_px, offset=indent_px)
+                            # An indent too deep for even one character still emits a bare indent line first
+                            if token and self._text_width(leading_ws + token[0], font) > max_px:
+                                lines.append(leading_ws)
+                            lines.extend(leading_ws + piece for piece in pieces[:-1])
+                            curr = leading_ws + (pieces[-1] if pieces else '')
                         else:
-                            final_lines.append(part)
-                            part = ch
-                    if part:
-                        final_lines.append(part)
-            return final_lines
-
-        # Slide duration (seconds) -> frames. Default to 0.5s for a snappy slide.
-        try:
-            term_slide_duration = float(os.getenv('TERM_SLIDE_DURATION_SEC', '0.5'))
-            term_slide_frames = max(1, int(term_slide_duration * self.fps))
-        except Exception:
-            term_slide_frames = max(1, int(0.5 * self.fps))
+                            curr = leading_ws + token.lstrip()
+                if curr.strip() or curr != leading_ws:
+                    lines.append(curr)
+                return lines
+
+            wrapped_code_lines = []
+            for l in code_lines:
+                sub = wrap_code_line(bg_draw, l, font_code, max_code_width_px)
+                wrapped_code_lines.extend(sub)
+        
+            # Faster typing for code (user adjustable). Base frames per char can be tuned with FRAMES_PER_CHAR_CODE
+            base_frames_per_char_code = self.cfg['frames_per_char_code']
+            # Scale code typing speed with SPEEDUP_FACTOR (higher -> fewer frames per char) and allow a code-specific speed factor
+            code_speed_factor = self.cfg['code_speed_factor']
+            try:
+                frames_per_char_code = max(1, int(base_frames_per_char_code / max(0.01, (speedup * code_speed_factor))))
+            except Exception:
+                frames_per_char_code = max(1, int(base_frames_per_char_code))
+        
+            # Optionally type several characters per frame (key sounds are still scheduled per character)
+            chars_per_frame = max(1, self.cfg['chars_per_frame'])
+
+            # Render incrementally: the background and the (now static) question are drawn once,
+            # finished code lines stay baked into `base_code`, and each typed character only
+            # redraws the tokens of the current line that changed since the previous frame.
+            # The Phase-2 canvas already holds the finished question; once its cursor is undone it is
+            # reused as is (only a slide_up that never reached its final offset needs a redraw).
+            if cursor_stash is not None:
+                img.paste(*cursor_stash)
+            if drawn_offset == 0:
+                base_static = img
+            else:
+                base_static, _ = create_bg()
+                y = question_y
+                for q_line in wrapped_question:
+                    self._paste_text(base_static, (margin_x, y), q_line, font_question, self.selected_question_color)
+                    y += 80
+            base_code = base_static.copy()
+            draw_code = ImageDraw.Draw(base_code)
+
+            # Only the line being typed is kept as text; finished lines live in `base_code` as pixels
+            # and are never re-wrapped or re-tokenized.
+            for line_idx, line in enumerate(wrapped_code_lines):
+                cy = code_y + line_idx * 70
+                draw_code.text((margin_x, cy), str(line_idx + 1), font=font_code, fill=self.colors['comment'])
+
+                # Indentation
+                indent = len(line) - len(line.lstrip())
+                typed_line = " " * indent
+                drawn_tokens = []
+                drawn_xs = []
+                end_x = code_x
+
+                cursor_stash = None
+                typed_chars = line[len(" " * indent):]
+                for char_idx, char in enumerate(typed_chars):
+                    typed_line += char
+                    # With CHARS_PER_FRAME > 1 several characters appear per frame; the last character
+                    # of a line always gets its frame so every line ends fully typed
+                    if (char_idx + 1) % chars_per_frame == 0 or char_idx + 1 == len(typed_chars):
+                        # Undo the previous frame's cursor before touching the line
+                        if cursor_stash is not None:
+                            base_code.paste(*cursor_stash)
+
+                        # Re-tokenize the current line only and redraw from the first token that differs
+                        # (a finished word may change color, e.g. an identifier becoming a function call)
+                        tokens = self.tokenize_code(typed_line)
+                        k = 0
+                        while k < len(drawn_tokens) and k < len(tokens) and drawn_tokens[k] == tokens[k]:
+                            k += 1
+                        x = drawn_xs[k] if k < len(drawn_xs) else end_x
+                        clear_box = (int(x), cy, self.width, cy + 70)
+                        base_code.paste(base_static.crop(clear_box), clear_box[:2])
+                        drawn_xs = drawn_xs[:k]
+                        for token, typ in tokens[k:]:
+                            drawn_xs.append(x)
+                            color = self.colors.get(typ, self.text_color)
+                            x = self._paste_text(base_code, (x, cy), token, font_code, color)
+                        drawn_tokens = tokens
+                        end_x = x
+
+                        # Cursor is drawn straight onto `base_code`; the pixels under it are stashed so it
+                        # can be removed again instead of copying the whole frame for every character
+                        cursor_stash = self._stash_glyph_area(base_code, (end_x, cy), self.cursor_style, font_code)
+                        self._paste_text(base_code, (end_x, cy), self.cursor_style, font_code, self.colors['cursor'])
+
+                        append_frame(base_code, frames_per_char_code)
+
+                    # Key sound events for code typing
+                    if char.strip() and self.audio_enabled and not lightweight:
+                        time_ms = int((frame_count / self.fps) * 1000)
+                        if time_ms - last_key_event_ms >= key_min_interval_ms:
+                            if self.key_samples:
+                                sample_idx = random.randrange(0, len(self.key_samples))
+                                audio_events.append((time_ms, 'key', sample_idx))
+                            else:
+                                audio_events.append((time_ms, 'key', None))
+                            last_key_event_ms = time_ms
 
-        for i in range(term_slide_frames):
-            img, draw = create_bg()
-            # Draw static content above the terminal
-            y = question_y
-            for q_line in wrapped_question:
-                draw.text((margin_x, y), q_line, font=font_question, fill=self.selected_question_color)
-                y += 80
-            cy = code_y
-            for idx, c_line in enumerate(current_code_lines):
-                wrapped_sub = wrap_code_line(draw, c_line, font_code, max_code_width_px)
-                for wi, sub in enumerate(wrapped_sub):
-                    if wi == 0:
-                        line_num = str(idx + 1)
-                        draw.text((margin_x, cy), line_num, font=font_code, fill=self.colors['comment'])
-                    tokens = self.tokenize_code(sub)
-                    x = code_x
-                    for token, typ in tokens:
-                        color = self.colors.get(typ, self.text_color)
-                        draw.text((x, cy), token, font=font_code, fill=color)
-                        x += draw.textlength(token, font=font_code)
-                    cy += 70
-
-            # Slide progress (0 -> 1)
-            progress = i / (term_slide_frames - 1) if term_slide_frames > 1 else 1.0
-
-            # Draw terminal sliding from chosen direction, but do NOT render header text yet.
-            if term_direction == 'up':
-                curr_term_y = int(self.height + (term_y_end - self.height) * progress)
-                draw.rectangle([0, curr_term_y, self.width, curr_term_y + term_height], fill=t_bg)
-                draw.rectangle([0, curr_term_y, self.width, curr_term_y + term_header_h], fill=t_header_bg)
-            elif term_direction == 'left':
-                curr_term_x = int(-self.width + (self.width * progress))
-                draw.rectangle([curr_term_x, term_y_end, curr_term_x + self.width, term_y_end + term_height], fill=t_bg)
-                draw.rectangle([curr_term_x, term_y_end, curr_term_x + self.width, term_y_end + term_header_h], fill=t_header_bg)
-            else:  # right
-                curr_term_x = int(self.width - (self.width * progress))
-                draw.rectangle([curr_term_x, term_y_end, curr_term_x + self.width, term_y_end + term_height], fill=t_bg)
-                draw.rectangle([curr_term_x, term_y_end, curr_term_x + self.width, term_y_end + term_header_h], fill=t_header_bg)
-
-            append_frame(img, 1)
-
-        # After slide completes, render the terminal at its final location with header text and use that as base image
-        img, draw = create_bg()
-        # Terminal final position
-        draw.rectangle([0, term_y_end, self.width, term_y_end + term_height], fill=t_bg)
-        draw.rectangle([0, term_y_end, self.width, term_y_end + term_header_h], fill=t_header_bg)
-        # Header text now visible after slide
-        draw.text((final_term_x + term_header_left_pad + term_inner_pad, term_y_end + 10), "Terminal", font=font_header, fill=t_text)
-        base_term_img = img
-
-        # Waiting State (Blinking Cursor + $) - use terminal colors and cursor shape
-        # base_term_img already contains the terminal drawn at final position with header
-        prompt_y = term_y_end + term_header_h + term_pad_top + term_inner_pad
-        term_content_x = final_term_x + term_pad_left + term_inner_pad
-        prompt_x = term_content_x
-
-        for _ in range(45): # Wait 1.5s
-            img = base_term_img.copy()
-            draw = ImageDraw.Draw(img)
+                # The cursor only lives in the serialized frames; keep `base_code` clean for the next line
+                if cursor_stash is not None:
+                    base_code.paste(*cursor_stash)
+            
+                # Newline pause - repeat the last written frame a few times
+                hold_last_frame(5)
 
-            # Blink cursor using terminal cursor char and color; use inner terminal padding
-            if _ % 8 < 4:
-                draw.text((term_content_x, prompt_y), "$ " + self.selected_term_cursor, font=font_terminal, fill=t_text)
-            else:
-                draw.text((term_content_x, prompt_y), "$ ", font=font_terminal, fill=t_text)
+        # No enter/keyboard sounds: omit enter sound
+        
+            # --- PHASE 4: TERMINAL EXECUTION ---
+            # --- PHASE 4: TERMINAL EXECUTION ---
+            # Terminal slide animation: randomly choose an entry direction: up, left, right
+            try:
+                term_height = int(os.getenv('TERM_HEIGHT_PX', '600'))
+            except Exception:
+                term_height = 600
+            # Allow a global bottom offset so terminal doesn't touch very bottom of video
+            try:
+                term_global_bottom_offset = int(os.getenv('TERM_GLOBAL_BOTTOM_OFFSET_PX', '0'))
+            except Exception:
+                term_global_bottom_offset = 12
+            # Terminal padding from each side (overrides/augments inner padding)
+            try:
+                term_pad_left = int(os.getenv('TERM_PAD_LEFT_PX', '40'))
+            except Exception:
+                term_pad_left = 12
+            try:
+                term_pad_right = int(os.getenv('TERM_PAD_RIGHT_PX', '40'))
+            except Exception:
+                term_pad_right = 12
+            try:
+                term_pad_top = int(os.getenv('TERM_PAD_TOP_PX', '12'))
+            except Exception:
+                term_pad_top = 12
+            try:
+                term_pad_bottom = int(os.getenv('TERM_PAD_BOTTOM_PX', '24'))
+            except Exception:
+                term_pad_bottom = 24
+
+
+            term_y_end = self.height - term_height - term_global_bottom_offset
+            # Random slide direction (up, left, right)
+            directions = ['up', 'left', 'right']
+            term_direction = random.choice(directions)
+
+            # Terminal theme colors
+            t_bg = self.terminal_theme.get('bg', (20, 20, 20))
+            t_header_bg = self.terminal_theme.get('header_bg', (40, 40, 40))
+            t_text = self.terminal_theme.get('text', (220, 220, 220))
+            t_accent = self.terminal_theme.get('accent', (80, 200, 120))
+            t_cursor_color = self.terminal_theme.get('cursor', t_accent)
+            # Inner padding inside the terminal box (small, to avoid large left gaps)
+            term_inner_pad = int(os.getenv('TERM_INNER_PADDING_PX', '16'))
+            # Right padding inside terminal to keep text away from edge
+            term_inner_right = int(os.getenv('TERM_INNER_RIGHT_PX', '72'))
+            # Bottom padding inside terminal so logs don't touch the bottom edge
+            term_bottom_pad = int(os.getenv('TERM_BOTTOM_PADDING_PX', '24'))
+            # Normalize: keep a single bottom padding variable
+            term_pad_bottom = term_pad_bottom if 'term_pad_bottom' in locals() else term_bottom_pad
+            # Header height for terminal (pixels)
+            term_header_h = int(os.getenv('TERM_HEADER_HEIGHT_PX', '60'))
+            # Header left-specific padding
+            term_header_left_pad = int(os.getenv('TERM_HEADER_LEFT_PAD_PX', '72'))
+
+            # Final terminal X (anchored to left when slide finishes). If you change slide logic
+            # to place the terminal elsewhere, update this accordingly.
+            final_term_x = 0
+
+            def terminal_wrap(draw, text, font, max_px):
+                """Wrap `text` into a list of lines that fit within max_px.
+                Break points are found by binary search over cumulative character widths; a line
+                breaks at its last space, or mid-word when a single word is wider than max_px.
+                """
+                if not text:
+                    return [""]
+                cum = np.cumsum(self._char_advances(text, font), dtype=np.float64)
+                n = len(text)
+                lines = []
+                start = 0
+                while start < n:
+                    offset = cum[start - 1] if start else 0.0
+                    end = max(start + 1, int(np.searchsorted(cum, offset + max_px, side='right')))
+                    if end >= n:
+                        lines.append(text[start:])
+                        break
+                    if text[end] == ' ':
+                        brk, start_next = end, end + 1
+                    else:
+                        space = text.rfind(' ', start, end)
+                        brk, start_next = (space, space + 1) if space > start else (end, end)
+                    lines.append(text[start:brk])
+                    start = start_next
+                return lines
 
-            # Optional debug overlay to render terminal coordinates and padding info
+            # Slide duration (seconds) -> frames. Default to 0.5s for a snappy slide.
+            try:
+                term_slide_duration = float(os.getenv('TERM_SLIDE_DURATION_SEC', '0.5'))
+                term_slide_frames = max(1, int(term_slide_duration * self.fps))
+            except Exception:
+                term_slide_frames = max(1, int(0.5 * self.fps))
+
+            # The question and code are final at this point: `base_code` is the static layer behind
+            # the sliding terminal, and the terminal itself is a rigid sprite rendered once.
+            layer_code_final = base_code
+            # +1 because the rectangles drawn for the terminal include their end coordinates
+            term_sprite = Image.new('RGB', (self.width + 1, term_height + 1), t_bg)
+            ImageDraw.Draw(term_sprite).rectangle([0, 0, self.width, term_header_h], fill=t_header_bg)
+            # Slide frames are composed in one persistent array: each frame restores the area the sprite
+            # covered in the previous frame from the static layer, blits the sprite by array slicing and
+            # is serialized straight from the array (no PIL image per frame).
+            layer_code_arr = np.asarray(layer_code_final)
+            term_sprite_arr = np.asarray(term_sprite)
+            sprite_h, sprite_w = term_sprite_arr.shape[:2]
+            frame = layer_code_arr.copy()
+            prev_box = None
+
+            for i in range(term_slide_frames):
+                # Slide progress (0 -> 1)
+                progress = i / (term_slide_frames - 1) if term_slide_frames > 1 else 1.0
+
+                # Paste the terminal sliding from chosen direction, but do NOT render header text yet.
+                if term_direction == 'up':
+                    term_pos = (0, int(self.height + (term_y_end - self.height) * progress))
+                elif term_direction == 'left':
+                    term_pos = (int(-self.width + (self.width * progress)), term_y_end)
+                else:  # right
+                    term_pos = (int(self.width - (self.width * progress)), term_y_end)
+
+                # Clip the sprite to the visible part of the frame
+                tx, ty = term_pos
+                x0, y0 = max(0, tx), max(0, ty)
+                x1, y1 = min(self.width, tx + sprite_w), min(self.height, ty + sprite_h)
+                if prev_box is not None:
+                    px0, py0, px1, py1 = prev_box
+                    frame[py0:py1, px0:px1] = layer_code_arr[py0:py1, px0:px1]
+                    prev_box = None
+                if x0 < x1 and y0 < y1:
+                    frame[y0:y1, x0:x1] = term_sprite_arr[y0 - ty:y1 - ty, x0 - tx:x1 - tx]
+                    prev_box = (x0, y0, x1, y1)
+                append_frame(frame, 1)
+
+            # After slide completes, render the terminal at its final location with header text and use that as base image
+            img, draw = create_bg()
+            # Terminal final position
+            draw.rectangle([0, term_y_end, self.width, term_y_end + term_height], fill=t_bg)
+            draw.rectangle([0, term_y_end, self.width, term_y_end + term_header_h], fill=t_header_bg)
+            # Header text now visible after slide
+            draw.text((final_term_x + term_header_left_pad + term_inner_pad, term_y_end + 10), "Terminal", font=font_header, fill=t_text)
+            base_term_img = img
+
+            # Waiting State (Blinking Cursor + $) - use terminal colors and cursor shape
+            # base_term_img already contains the terminal drawn at final position with header
+            prompt_y = term_y_end + term_header_h + term_pad_top + term_inner_pad
+            term_content_x = final_term_x + term_pad_left + term_inner_pad
+            prompt_x = term_content_x
+
+            # The blink and command-typing frames only differ in the prompt row, so they share one
+            # work image: the row is restored from the base image before each new prompt state.
+            work_img = base_term_img.copy()
+            work_draw = ImageDraw.Draw(work_img)
+            # One terminal text row (result lines start 60px below the prompt). The block cursors
+            # (█ ▊ ▌) reach above prompt_y, so the restored box starts at the highest ink of any prompt character.
+            command = f"{self.language_commands[self.selected_language]} index.{self.language_extensions[self.selected_language]}"
+            prompt_top = min(0, min(font_terminal.getbbox(c)[1] for c in set("$ " + self.selected_term_cursor + command)))
+            prompt_box = (0, prompt_y + prompt_top, self.width, prompt_y + 60)
+            prompt_bg = base_term_img.crop(prompt_box)
+
+            def draw_prompt(text):
+                work_img.paste(prompt_bg, prompt_box[:2])
+                self._paste_text(work_img, (term_content_x, prompt_y), text, font_terminal, t_text)
+
+            # Optional debug overlay to render terminal coordinates and padding info (blink frames only)
+            debug_box = None
             try:
-                if os.getenv('TERM_DEBUG', '0') == '1':
+                if self.cfg['term_debug']:
                     debug_text = f"term_y_end={term_y_end} term_h={term_height} header_h={term_header_h} pad_top={term_pad_top} pad_left={term_pad_left} pad_right={term_pad_right}"
-                    draw.text((10, 10), debug_text, font=font_header, fill=(255,255,255))
+                    debug_box = tuple(int(v) for v in work_draw.textbbox((10, 10), debug_text, font=font_header))
+                    work_draw.text((10, 10), debug_text, font=font_header, fill=(255,255,255))
             except Exception:
-                pass
-            append_frame(img, 1)
+                debug_box = None
 
-        # Type Command
-        command = f"{self.language_commands[self.selected_language]} index.{self.language_extensions[self.selected_language]}"
-        curr_cmd = "$ "
-        for char in command:
-            img = base_term_img.copy()
-            draw = ImageDraw.Draw(img)
-            curr_cmd += char
-            # Use terminal theme colors and cursor shape for prompt
-            prompt_display = curr_cmd + self.selected_term_cursor
-            draw.text((term_content_x, prompt_y), prompt_display, font=font_terminal, fill=t_text)
+            # Wait 1.5s. The cursor blinks in runs of 4 frames between just two images, so both are
+            # rendered and serialized once and then written run by run.
+            blink_frames = 45
+            blink_run = 4
+            # Blink cursor using terminal cursor char and color; use inner terminal padding
+            draw_prompt("$ " + self.selected_term_cursor)
+            blink_on = encode_frame(work_img)
+            draw_prompt("$ ")
+            blink_off = encode_frame(work_img)
+            for run_start in range(0, blink_frames, blink_run):
+                last_frame = blink_on if run_start % 8 < 4 else blink_off
+                write_frame(last_frame, min(blink_run, blink_frames - run_start))
+
+            if debug_box is not None:
+                work_img.paste(base_term_img.crop(debug_box), debug_box[:2])
+
+            # Type Command
+            curr_cmd = "$ "
             # Make terminal typing faster by default; allow tuning
-            try:
-                key_frames = int(os.getenv('TERM_TYPING_FRAMES_PER_CHAR', '1'))
-            except Exception:
-                key_frames = 1
-            append_frame(img, max(1, key_frames))
+            key_frames = max(1, self.cfg['term_typing_frames_per_char'])
+            for char in command:
+                curr_cmd += char
+                # Use terminal theme colors and cursor shape for prompt
+                draw_prompt(curr_cmd + self.selected_term_cursor)
+                append_frame(work_img, key_frames)
+
+                # Key sound for terminal typing
+                if char.strip() and self.audio_enabled and not lightweight:
+                    time_ms = int((frame_count / self.fps) * 1000)
+                    if time_ms - last_key_event_ms >= key_min_interval_ms:
+                        if self.key_samples:
+                            sample_idx = random.randrange(0, len(self.key_samples))
+                            audio_events.append((time_ms, 'key', sample_idx))
+                        else:
+                            audio_events.append((time_ms, 'key', None))
+                        last_key_event_ms = time_ms
 
-            # Key sound for terminal typing
-            if char.strip() and self.audio_enabled and not lightweight:
+            # Enter sound after command
+            if self.audio_enabled and not lightweight:
                 time_ms = int((frame_count / self.fps) * 1000)
-                if time_ms - last_key_event_ms >= key_min_interval_ms:
-                    if self.key_samples:
-                        sample_idx = random.randrange(0, len(self.key_samples))
-                        audio_events.append((time_ms, 'key', sample_idx))
-                    else:
-                        audio_events.append((time_ms, 'key', None))
-                    last_key_event_ms = time_ms
-
-        # Enter sound after command
-        if self.audio_enabled and not lightweight:
-            time_ms = int((frame_count / self.fps) * 1000)
-            audio_events.append((time_ms, 'enter', None))
-    # No enter sound (keyboard noises disabled)
+                audio_events.append((time_ms, 'enter', None))
+        # No enter sound (keyboard noises disabled)
 
-        # Show Result
-        output_lines = real_output.split('\n')
-        result_color = self.colors['error'] if return_code != 0 else self.colors['string']
+            # Show Result
+            output_lines = real_output.split('\n')
+            result_color = self.colors['error'] if return_code != 0 else self.colors['string']
         
-        # Hold result for 3 seconds
-        for _ in range(90):
+            # The result frame is static: render it once and hold it for 3 seconds (the final hold)
             img = base_term_img.copy()
             draw = ImageDraw.Draw(img)
             # Use terminal inner padding and terminal text color for command
@@ -1022,217 +1453,179 @@ class ShortsVideoGenerator:
                     draw.text((term_content_x, res_y), wline, font=font_terminal, fill=out_color)
                     res_y += 50
 
-            append_frame(img, 1)
-
-        # --- RENDER VIDEO ---
-        # All frames have been written progressively to temp_video
-        print(f"🎥 Rendering complete ({frame_count} frames written) -> {temp_video}")
-        out.release()
-
-        # --- MIX AUDIO ---
-        print("🎵 Mixing Audio...")
-        total_duration = frame_count / self.fps * 1000
-        if self.audio_enabled:
-            final_audio = AudioSegment.silent(duration=total_duration)
-            bg_file = self._find_background_file() if hasattr(self, '_find_background_file') else None
-            # decide where background should start: after TTS if present, else at 0
-            try:
-                bg_start_ms = int(tts_duration_ms) if tts_path else 0
-            except Exception:
-                bg_start_ms = 0
-
-            if bg_file and os.path.exists(bg_file):
-                try:
-                    bg = AudioSegment.from_file(bg_file)
-                    # Loop background if it's shorter than remaining duration after start
-                    remaining = int(total_duration) - bg_start_ms
-                    if remaining <= 0:
-                        # nothing to add
-                        bg = None
+            hold_final_frame(img, result_hold_frames)
+
+            # --- MIX AUDIO ---
+            def mix_audio():
+                """Mix the collected audio events over the finished timeline.
+                Returns the mixed AudioSegment, or None when audio is disabled.
+                """
+                print("🎵 Mixing Audio...")
+                total_duration = frame_count / self.fps * 1000
+                # Every sound is collected as a (position_ms, segment, gain_db) layer and summed once in
+                # _mixdown instead of chaining AudioSegment.overlay, which copies the whole track per event.
+                audio_layers = []
+                if self.audio_enabled:
+                    bg_file = self._find_background_file() if hasattr(self, '_find_background_file') else None
+                    # decide where background should start: after TTS if present, else at 0
+                    try:
+                        bg_start_ms = int(tts_duration_ms) if tts_path else 0
+                    except Exception:
+                        bg_start_ms = 0
+
+                    if bg_file and os.path.exists(bg_file):
+                        try:
+                            # Loop background if it's shorter than remaining duration after start
+                            remaining = int(total_duration) - bg_start_ms
+                            if remaining > 0:
+                                # Loop, trim and apply default background gain in ffmpeg, overlay at bg_start_ms
+                                bg = self._load_background_track(bg_file, remaining, self.cfg['bg_music_gain_db'])
+                                audio_layers.append((bg_start_ms, bg, 0))
+                        except Exception as e:
+                            logging.warning(f"Failed to load custom background {bg_file}: {e}")
+                            # Fallback to synthesized music
+                            bg_music = self.create_background_music(max(0, int(total_duration - bg_start_ms)))
+                            if bg_music is not None:
+                                audio_layers.append((bg_start_ms, bg_music, self.cfg['bg_music_gain_db']))
                     else:
-                        if len(bg) < remaining:
-                            times = (int(remaining) // len(bg)) + 1
-                            bg = bg * times
-                        bg = bg[:int(remaining)]
-                        # Apply default background gain and overlay at bg_start_ms
-                        bg = bg.apply_gain(int(os.getenv('BG_MUSIC_GAIN_DB', '-12')))
-                        final_audio = final_audio.overlay(bg, position=bg_start_ms)
-                except Exception as e:
-                    logging.warning(f"Failed to load custom background {bg_file}: {e}")
-                    # Fallback to synthesized music
-                    bg_music = self.create_background_music(max(0, int(total_duration - bg_start_ms)))
-                    if bg_music is not None:
-                        bg_music = bg_music.apply_gain(int(os.getenv('BG_MUSIC_GAIN_DB', '-12')))
-                        final_audio = final_audio.overlay(bg_music, position=bg_start_ms)
-            else:
-                bg_music = self.create_background_music(max(0, int(total_duration - bg_start_ms)))
-                if bg_music is not None:
-                    bg_music = bg_music.apply_gain(int(os.getenv('BG_MUSIC_GAIN_DB', '-12')))
-                    final_audio = final_audio.overlay(bg_music, position=bg_start_ms)
-        else:
-            final_audio = None
+                        bg_music = self.create_background_music(max(0, int(total_duration - bg_start_ms)))
+                        if bg_music is not None:
+                            audio_layers.append((bg_start_ms, bg_music, self.cfg['bg_music_gain_db']))
         
-        click_sound = self.create_mechanical_click()
-        # Make clicks a bit softer or louder based on env setting so background music sits under them; keep mechanical clicks as preferred fallback
-        try:
-            click_gain_db = int(os.getenv('KEY_CLICK_GAIN_DB', '-3'))
-        except Exception:
-            click_gain_db = -3
-        if click_sound is not None:
-            click_sound = click_sound.apply_gain(click_gain_db)
-        # Prefer an enter sample file if present, otherwise use synthesized enter sound
-        enter_sample = None
-        enter_file = self._find_enter_sample() if hasattr(self, '_find_enter_sample') else None
-        if enter_file and self.audio_enabled:
-            try:
-                enter_sample = AudioSegment.from_file(enter_file)
-            except Exception:
-                enter_sample = None
-        enter_sound = enter_sample if enter_sample is not None else self.create_enter_sound()
+                # Mechanical clicks (synthesized and gain-adjusted at init) are the preferred fallback
+                click_sound = self._click_sound
+                # Prefer the enter sample decoded at init, otherwise use synthesized enter sound
+                enter_sound = self._enter_sample if self._enter_sample is not None else self._enter_synth
         
-    # If audio is not enabled, skip mixing entirely
-        if self.audio_enabled:
-            # Prepare background file (prefer user-provided file, otherwise keep already added bg_music)
-            bg_file = self._find_background_file() if hasattr(self, '_find_background_file') else None
-            if bg_file and os.path.exists(bg_file):
-                try:
-                    bg = AudioSegment.from_file(bg_file)
-                    # Reduce background track volume substantially
-                    bg = bg.apply_gain(-18)
-                    final_audio = final_audio.overlay(bg)
-                except Exception as e:
-                    logging.warning(f"Failed to load custom background {bg_file}: {e}")
-
-            for time_ms, type, data in audio_events:
-                try:
-                    if type == 'tts' and data:
-                        # Increase TTS volume a bit so it sits above background/keys
-                        # Allow mp3, wav, or generic file type detection
+            # If audio is not enabled, skip mixing entirely
+                final_audio = None
+                if self.audio_enabled:
+                    # Prepare background file (prefer user-provided file, otherwise keep already added bg_music)
+                    bg_file = self._find_background_file() if hasattr(self, '_find_background_file') else None
+                    if bg_file and os.path.exists(bg_file):
                         try:
-                            if data.lower().endswith('.mp3'):
-                                sound = AudioSegment.from_mp3(data).apply_gain(+6)
-                            elif data.lower().endswith('.wav'):
-                                sound = AudioSegment.from_wav(data).apply_gain(+6)
-                            else:
-                                sound = AudioSegment.from_file(data).apply_gain(+6)
+                            # Reduce background track volume substantially
+                            bg = self._load_background_track(bg_file, int(total_duration), -18, loop=False)
+                            audio_layers.append((0, bg, 0))
                         except Exception as e:
-                            logging.warning(f"Failed to load TTS audio {data}: {e}")
-                            sound = None
-                    elif type == 'click':
-                        sound = click_sound
-                    elif type == 'enter':
-                        sound = enter_sound
-                    elif type == 'key':
-                        # data is index into self.key_samples
-                        if self.key_samples and isinstance(data, int) and data < len(self.key_samples):
-                            sample_path = self.key_samples[data]
-                            try:
-                                sound = AudioSegment.from_file(sample_path)
-                                # Apply configurable gain to key samples and a small random jitter so repeated keys don't sound identical
-                                try:
-                                    base_gain = int(os.getenv('KEY_SAMPLE_GAIN_DB', '-3'))
-                                except Exception:
-                                    base_gain = -6
-                                jitter = random.randint(-2, 2)
-                                sound = sound.apply_gain(base_gain + jitter)
+                            logging.warning(f"Failed to load custom background {bg_file}: {e}")
+
+                    for time_ms, type, data in audio_events:
+                        gain_db = 0
+                        try:
+                            if type == 'tts' and data:
+                                # Increase TTS volume a bit so it sits above background/keys
+                                # Allow mp3, wav, or generic file type detection
+                                gain_db = 6
                                 try:
-                                    from pydub import effects
-                                    # Allow configurable % variation for key sample speed. Default 0% (no change).
-                                    try:
-                                        var_pct = float(os.getenv('KEY_SAMPLE_SPEED_VARIATION_PERCENT', '0.0'))
-                                    except Exception:
-                                        var_pct = 0.0
-                                    variation = max(0.0, var_pct / 100.0)
-                                    if variation > 0.0:
-                                        # random variation in range [-variation, +variation]
-                                        speed = 1.0 + (random.random() - 0.5) * (variation * 2)
-                                        # small speed adjustments; wrap in try because effects.speedup may fail in some environments
-                                        sound = effects.speedup(sound, playback_speed=speed)
-                                except Exception:
-                                    pass
-                            except Exception as e:
-                                logging.warning(f"Failed to load key sample {sample_path}: {e}")
-                                sound = None
-                        else:
-                            # Prefer a mechanical click fallback the majority of the time but add variety
-                            if click_sound and random.random() < 0.8:
+                                    if data == tts_path and tts_audio is not None:
+                                        # Already decoded (and sped up) while measuring the TTS duration
+                                        sound = tts_audio
+                                    elif data.lower().endswith('.mp3'):
+                                        sound = AudioSegment.from_mp3(data)
+                                    elif data.lower().endswith('.wav'):
+                                        sound = AudioSegment.from_wav(data)
+                                    else:
+                                        sound = AudioSegment.from_file(data)
+                                except Exception as e:
+                                    logging.warning(f"Failed to load TTS audio {data}: {e}")
+                                    sound = None
+                            elif type == 'click':
                                 sound = click_sound
+                            elif type == 'enter':
+                                sound = enter_sound
+                            elif type == 'key':
+                                # data is index into self.key_samples
+                                if self.key_samples and isinstance(data, int) and data < len(self.key_samples):
+                                    # Samples are decoded and pre-gained at init (see _load_key_audio)
+                                    variants = self._key_audio.get(self.key_samples[data])
+                                    if variants:
+                                        # Small random gain jitter so repeated keys don't sound identical
+                                        gain_db = random.randint(-2, 2)
+                                        # Pick a tempo-shifted variant when speed variation is enabled
+                                        sound = variants[0] if len(variants) == 1 else random.choice(variants)
+                                    else:
+                                        sound = None
+                                else:
+                                    # Prefer a mechanical click fallback the majority of the time but add variety
+                                    if click_sound and random.random() < 0.8:
+                                        sound = click_sound
+                                    else:
+                                        sound = random.choice(self._click_pool) if self._click_pool else click_sound
                             else:
-                                sound = self.create_random_key_click() or click_sound
-                    else:
-                        continue
-                except Exception as e:
-                    logging.warning(f"Audio event failed: {e}")
-                    continue
+                                continue
+                        except Exception as e:
+                            logging.warning(f"Audio event failed: {e}")
+                            continue
+
+                        if sound is not None:
+                            audio_layers.append((time_ms, sound, gain_db))
+
+                    final_audio = self._mixdown(total_duration, audio_layers)
+                return final_audio
+
+            # --- RENDER VIDEO ---
+            # All frames have been written progressively to temp_video
+            print(f"🎥 Rendering complete ({frame_count} frames written) -> {temp_video}")
+            # The audio track only depends on the event list and the final frame count, so it is mixed
+            # on a worker thread while the encoder drains the frames still queued for it
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as audio_pool:
+                audio_future = audio_pool.submit(mix_audio)
+                if video_proc is not None:
+                    frame_queue.put(None)
+                    writer_thread.join()
+                    try:
+                        video_proc.stdin.close()
+                    except Exception as e:
+                        writer_errors.append(e)
+                    if video_proc.wait() != 0 or writer_errors:
+                        detail = f": {writer_errors[0]}" if writer_errors else ""
+                        raise RuntimeError(f"ffmpeg video encode failed with exit code {video_proc.returncode}{detail}")
+                else:
+                    out.release()
+                final_audio = audio_future.result()
+        except BaseException:
+            abort_encoder()
+            raise
 
-                if sound is not None:
-                    final_audio = final_audio.overlay(sound, position=time_ms)
-            
-        temp_audio = None
-        if self.audio_enabled:
-            temp_audio = os.path.join(self.audio_dir, f"temp_audio_{safe_name}.mp3")
-            try:
-                final_audio.export(temp_audio, format="mp3")
-            except Exception as e:
-                logging.warning(f"Failed to export final audio: {e}")
-                temp_audio = None
-        
         # --- MERGE ---
         final_output = os.path.join(self.output_dir, f"{filename}.mp4")
-        if self.ffmpeg_available and temp_audio:
+        if self.ffmpeg_available and final_audio is not None:
             try:
+                # The mixed PCM is piped straight into the mux, so no temp audio file is written
                 subprocess.run([
-                    'ffmpeg', '-y', '-i', temp_video, '-i', temp_audio,
-                    '-c:v', 'copy', '-c:a', 'aac', final_output
-                ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+                    'ffmpeg', '-y', '-i', temp_video,
+                    '-f', 's16le', '-ar', str(final_audio.frame_rate), '-ac', str(final_audio.channels), '-i', 'pipe:0',
+                    '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy', '-c:a', 'aac', '-threads', '0',
+                    # moov atom up front so the upload/players can start reading the file immediately
+                    '-movflags', '+faststart', final_output
+                ], input=final_audio.set_sample_width(2).raw_data,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
             except Exception as e:
                 logging.warning(f"ffmpeg merge failed, saving video without audio: {e}")
-                # If ffmpeg merge fails, copy temp_video to final output (fallback)
+                # If ffmpeg merge fails, move temp_video to final output (fallback); both live in
+                # output_dir, so this is a rename rather than a copy of the whole file
                 try:
-                    if os.path.exists(temp_video):
-                        import shutil
-                        shutil.copyfile(temp_video, final_output)
-                    else:
-                        raise FileNotFoundError(f"temp_video not found: {temp_video}")
+                    os.replace(temp_video, final_output)
                 except Exception as e2:
                     logging.error(f"Failed to save video without audio: {e2}")
                     raise
         else:
-            # If no ffmpeg or audio, just copy the video file as final output
+            # If no ffmpeg or audio, just move the video file into place as final output
             try:
-                if os.path.exists(temp_video):
-                    import shutil
-                    shutil.copyfile(temp_video, final_output)
-                else:
-                    raise FileNotFoundError(f"temp_video not found: {temp_video}")
+                os.replace(temp_video, final_output)
             except Exception as e:
                 logging.error(f"Failed to save video file without merge: {e}")
                 raise
         
         # Cleanup
-        # Cleanup remaining temp files if they exist
-        try:
-            if os.path.exists(temp_video):
-                os.remove(temp_video)
-        except Exception:
-            pass
-        try:
-            if temp_audio and os.path.exists(temp_audio):
-                os.remove(temp_audio)
-        except Exception:
-            pass
+        # Cleanup remaining temp files if they exist (temp_video is already gone when it was moved)
+        with contextlib.suppress(OSError):
+            os.remove(temp_video)
         # also cleanup any generated TTS files for this job
-        try:
-            tts_candidate_mp3 = os.path.join(self.audio_dir, f"tts_{safe_name}.mp3")
-            tts_candidate_re = os.path.join(self.audio_dir, f"tts_{safe_name}_re.wav")
-            for f in (tts_candidate_mp3, tts_candidate_re):
-                try:
-                    if f and os.path.exists(f):
-                        os.remove(f)
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        for suffix in ('.mp3', '.wav', '_re.wav'):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self.audio_dir, f"tts_{safe_name}{suffix}"))
         
         return final_output
 
@@ -2,12 +2,11 @@ import os
 import json
 import pickle
 import base64
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from database import db
 
+# The google client libraries are imported inside the methods that use them: they pull in
+# many submodules and are only needed once an auth check or upload actually happens.
+
 class YouTubeManager:
     def __init__(self):
         self.SCOPES = [
@@ -18,11 +17,18 @@ class YouTubeManager:
         self.api_service_name = "youtube"
         self.api_version = "v3"
         self.youtube = None
+        # Parsed client config and credentials, cached after the first DB/env lookup
+        self._client_secrets = None
+        self._creds = None
+        self._creds_token = None
 
     def _get_client_secrets(self):
         """Construct client config from environment variables.
         The function prefers env vars over DB, to allow updates.
+        The result is cached on the instance once found.
         """
+        if self._client_secrets is not None:
+            return self._client_secrets
         # 1. Build config from env vars if available
         client_id = os.getenv("GOOGLE_CLIENT_ID")
         client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -39,22 +45,26 @@ class YouTubeManager:
             }
             # Save constructed config to DB for future runs
             db.set_config('client_secrets', json.dumps(config))
+            self._client_secrets = config
             return config
 
         # 2. Fallback to DB
         secrets = db.get_config('client_secrets')
         if secrets:
-            return json.loads(secrets)
-
-        return None
+            self._client_secrets = json.loads(secrets)
+            return self._client_secrets
 
         return None
 
     def _save_credentials(self, creds):
         # Pickle and base64 encode to store in text field
-        pickled = base64.b64encode(pickle.dumps(creds)).decode('utf-8')
+        pickled = base64.b64encode(pickle.dumps(creds, protocol=pickle.HIGHEST_PROTOCOL)).decode('utf-8')
         db.set_config('youtube_token', pickled)
-        # Also store a basic json shape for human inspection and migration
+        self._creds, self._creds_token = creds, pickled
+        # Only with YT_TOKEN_DEBUG=1: also store a basic json shape for human inspection and migration
+        # (skipped by default so a token refresh is a single DB write)
+        if os.getenv('YT_TOKEN_DEBUG', '0') != '1':
+            return
         try:
             cred_json = {
                 'token': getattr(creds, 'token', None),
@@ -69,13 +79,21 @@ class YouTubeManager:
             pass
 
     def _load_credentials(self):
+        # The stored token is always re-read (another manager in this process may have re-authorized),
+        # but it is only unpickled again when the string actually changed
         token = db.get_config('youtube_token')
-        if token:
-            return pickle.loads(base64.b64decode(token))
-        return None
+        if not token:
+            return None
+        if token != self._creds_token:
+            self._creds, self._creds_token = pickle.loads(base64.b64decode(token)), token
+        return self._creds
 
     def authenticate(self):
         """Authenticate and save tokens to DB"""
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import Flow
+        from googleapiclient.discovery import build
+
         creds = self._load_credentials()
         
         if not creds or not creds.valid:
@@ -116,6 +134,7 @@ class YouTubeManager:
                 return True
             # If expired but refresh token exists, we can still refresh programmatically
             if getattr(creds, 'expired', False) and getattr(creds, 'refresh_token', None):
+                from google.auth.transport.requests import Request
                 # Attempt a quiet refresh
                 try:
                     creds.refresh(Request())
@@ -146,7 +165,10 @@ class YouTubeManager:
             }
         }
 
-        media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
+        from googleapiclient.http import MediaFileUpload
+
+        # Bounded 16 MiB chunks: memory stays flat and a failed chunk can be resent on its own
+        media = MediaFileUpload(file_path, chunksize=16 * 1024 * 1024, resumable=True, mimetype='video/mp4')
         
         print(f"📤 Uploading to YouTube: {title}")
         request = self.youtube.videos().insert(
@@ -157,7 +179,9 @@ class YouTubeManager:
         
         response = None
         while response is None:
-            status, response = request.next_chunk()
+            # googleapiclient retries 5xx/429 and socket errors with backoff; the resumable
+            # session continues from the last acknowledged byte
+            status, response = request.next_chunk(num_retries=5)
             if status:
                 print(f"   Progress: {int(status.progress() * 100)}%")
                 